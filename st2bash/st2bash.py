@@ -9,266 +9,250 @@ executable files.
 Author: Claude Opus 4.5 (Anthropic)
 """
 
+import contextlib
+import functools
+import hashlib
+import json
+import os
 import re
 import sys
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Set
+from typing import Dict, List, Optional, Sequence, Tuple, Set
 
 # ----------------------------------------------------------------------
 # Tokens
 # ----------------------------------------------------------------------
 
-@dataclass
+# Token types
+(T_EOF, T_NAME, T_KEYWORD, T_BINARY, T_BLOCKPARAM,
+ T_INT, T_FLOAT, T_STRING, T_SYMBOL,
+ T_ASSIGN, T_CARET, T_DOT, T_SEMI,
+ T_LPAREN, T_RPAREN, T_LBRACKET, T_RBRACKET, T_BAR) = range(18)
+
+TOKEN_NAMES = [
+    'EOF', 'NAME', 'KEYWORD', 'BINARY', 'BLOCKPARAM',
+    'INT', 'FLOAT', 'STRING', 'SYMBOL',
+    'ASSIGN', 'CARET', 'DOT', 'SEMI',
+    'LPAREN', 'RPAREN', 'LBRACKET', 'RBRACKET', 'BAR',
+]
+
 class Token:
-    type: str
-    value: str
-    pos: int = 0  # position in source
+    # Tokens are created once per lexeme, so keep them lean: no __dict__,
+    # no dataclass machinery
+    __slots__ = ('type', 'value', 'pos')
+    
+    def __init__(self, type: int, value: str, pos: int = 0):
+        self.type = type
+        self.value = value
+        self.pos = pos  # position in source
+    
+    def __repr__(self) -> str:
+        return f"Token({TOKEN_NAMES[self.type]}, {self.value!r}, {self.pos})"
+
+# Characters that may make up a binary selector
+BINARY_CHARS = '+-*/\\<>=@%|&?,~'
+
+# Single-character tokens
+PUNCTUATION = {
+    '^': T_CARET,     # return arrow
+    '.': T_DOT,       # statement separator
+    ';': T_SEMI,      # cascade
+    '(': T_LPAREN,
+    ')': T_RPAREN,
+    '[': T_LBRACKET,  # block brackets
+    ']': T_RBRACKET,
+    '|': T_BAR,       # temporaries
+}
+
+# Whitespace and "comments", skipped in front of every token
+TOKEN_SKIP = r'(?:\s+|"[^"]*"?)*'
+
+# Token rules in priority order: (token type, regex). Where the regex has a
+# group, the token's value is that group rather than the whole match.
+IDENT = r'[^\W\d]\w*'  # letter or underscore, then letters, digits, underscores
+TOKEN_RULES = [
+    (T_KEYWORD, IDENT + ':'),             # a keyword is a name ending with :
+    (T_NAME, IDENT),
+    *[(type, re.escape(c)) for c, type in PUNCTUATION.items()],
+    (T_ASSIGN, ':='),
+    (T_FLOAT, r'-?\d+\.\d+'),             # a dot not followed by a digit ends a statement
+    (T_INT, r'-?\d+'),
+    (T_STRING, r"'((?:[^']|'')*)'?"),     # '' is an escaped quote
+    (T_SYMBOL, r"#'([^']*)'?"),           # #'symbol with spaces'
+    (T_SYMBOL, r'#([\w:]*)'),
+    (T_BLOCKPARAM, r':([^\W\d_]\w*)'),
+    (T_BINARY, '[' + re.escape(BINARY_CHARS) + ']+'),
+    (None, r'\Z'),                        # trailing whitespace and comments
+    (T_EOF, r'(?s:.)'),                   # anything else is an error
+]
+
+def _compile_token_rules(rules: List[Tuple[Optional[int], str]]) -> Tuple[re.Pattern, list]:
+    """Combine the rules into one regex, one group per rule.
+    
+    Each match is one token preceded by anything skipped, so finditer()
+    yields exactly one match per token. Returns the regex and a table
+    indexed by a match's lastindex giving the token type and the group
+    holding the token's value.
+    """
+    alternatives = []
+    table = [None]  # group numbers start at 1
+    for type, pattern in rules:
+        group = len(table)
+        inner = re.compile(pattern).groups
+        alternatives.append(f'({pattern})')
+        table.append((type, group + inner))
+        table.extend([None] * inner)
+    return re.compile(TOKEN_SKIP + '(?:' + '|'.join(alternatives) + ')'), table
+
+TOKEN_RE, TOKEN_RULE_TABLE = _compile_token_rules(TOKEN_RULES)
 
 def tokenize(source: str) -> List[Token]:
+    """Split source into tokens with a single pass of TOKEN_RE"""
     tokens = []
-    i = 0
+    append = tokens.append
+    intern = sys.intern
+    table = TOKEN_RULE_TABLE
     
-    while i < len(source):
-        # Skip whitespace
-        if source[i].isspace():
-            i += 1
-            continue
-        
-        # Skip comments (Smalltalk uses "double quotes")
-        if source[i] == '"':
-            i += 1
-            while i < len(source) and source[i] != '"':
-                i += 1
-            i += 1  # skip closing "
-            continue
-        
-        # Return arrow
-        if source[i] == '^':
-            tokens.append(Token('CARET', '^', i))
-            i += 1
-            continue
-        
-        # Assignment
-        if source[i:i+2] == ':=':
-            tokens.append(Token('ASSIGN', ':=', i))
-            i += 2
-            continue
-        
-        # Dot (statement separator)
-        if source[i] == '.':
-            tokens.append(Token('DOT', '.', i))
-            i += 1
-            continue
-        
-        # Semicolon (cascade)
-        if source[i] == ';':
-            tokens.append(Token('SEMI', ';', i))
-            i += 1
-            continue
-        
-        # Parentheses
-        if source[i] == '(':
-            tokens.append(Token('LPAREN', '(', i))
-            i += 1
-            continue
-        if source[i] == ')':
-            tokens.append(Token('RPAREN', ')'))
-            i += 1
-            continue
-        
-        # Block brackets
-        if source[i] == '[':
-            tokens.append(Token('LBRACKET', '[', i))
-            i += 1
-            continue
-        if source[i] == ']':
-            tokens.append(Token('RBRACKET', ']', i))
-            i += 1
-            continue
-        
-        # Vertical bar (for temporaries)
-        if source[i] == '|':
-            tokens.append(Token('BAR', '|', i))
-            i += 1
-            continue
-        
-        # Numbers (integer or float)
-        if source[i].isdigit() or (source[i] == '-' and i + 1 < len(source) and source[i+1].isdigit()):
-            start = i
-            j = i
-            if source[j] == '-':
-                j += 1
-            while j < len(source) and source[j].isdigit():
-                j += 1
-            # Only treat as float if dot is followed by digit (not statement separator)
-            if j < len(source) and source[j] == '.' and j + 1 < len(source) and source[j+1].isdigit():
-                j += 1
-                while j < len(source) and source[j].isdigit():
-                    j += 1
-                tokens.append(Token('FLOAT', source[i:j], start))
-            else:
-                tokens.append(Token('INT', source[i:j], start))
-            i = j
-            continue
-        
-        # String literals
-        if source[i] == "'":
-            start = i
-            j = i + 1
-            while j < len(source):
-                if source[j] == "'":
-                    if j + 1 < len(source) and source[j+1] == "'":
-                        j += 2  # escaped quote
-                    else:
-                        break
-                else:
-                    j += 1
-            tokens.append(Token('STRING', source[i+1:j], start))
-            i = j + 1
-            continue
-        
-        # Symbol literals (#symbol or #'symbol with spaces')
-        if source[i] == '#':
-            start = i
-            if i + 1 < len(source) and source[i+1] == "'":
-                # #'symbol with spaces'
-                j = i + 2
-                while j < len(source) and source[j] != "'":
-                    j += 1
-                tokens.append(Token('SYMBOL', source[i+2:j], start))
-                i = j + 1
-            else:
-                # #symbol
-                j = i + 1
-                while j < len(source) and (source[j].isalnum() or source[j] in '_:'):
-                    j += 1
-                tokens.append(Token('SYMBOL', source[i+1:j], start))
-                i = j
-            continue
-        
-        # Identifiers and keywords
-        if source[i].isalpha() or source[i] == '_':
-            start = i
-            j = i
-            while j < len(source) and (source[j].isalnum() or source[j] == '_'):
-                j += 1
-            name = source[i:j]
-            # Check if it's a keyword (ends with :)
-            if j < len(source) and source[j] == ':':
-                tokens.append(Token('KEYWORD', name + ':', start))
-                i = j + 1
-            else:
-                tokens.append(Token('NAME', name, start))
-                i = j
-            continue
-        
-        # Block parameter (colon followed by name)
-        if source[i] == ':' and i + 1 < len(source) and source[i+1].isalpha():
-            start = i
-            j = i + 1
-            while j < len(source) and (source[j].isalnum() or source[j] == '_'):
-                j += 1
-            tokens.append(Token('BLOCKPARAM', source[i+1:j], start))
-            i = j
-            continue
-        
-        # Binary selectors (operators)
-        binary_chars = '+-*/\\<>=@%|&?,~'
-        if source[i] in binary_chars:
-            start = i
-            j = i
-            while j < len(source) and source[j] in binary_chars:
-                j += 1
-            tokens.append(Token('BINARY', source[i:j], start))
-            i = j
-            continue
-        
-        raise SyntaxError(f"Unexpected character: {source[i]!r} at position {i}")
+    for m in TOKEN_RE.finditer(source):
+        rule = m.lastindex
+        type, group = table[rule]
+        if type is None:
+            break
+        if type == T_EOF:
+            raise SyntaxError(f"Unexpected character: {m.group(rule)!r} at position {m.start(rule)}")
+        value = m[group]
+        if type <= T_BLOCKPARAM:
+            # Names and selectors recur throughout a method
+            value = intern(value)
+        append(Token(type, value, m.start(rule)))
     
-    tokens.append(Token('EOF', '', len(source)))
+    append(Token(T_EOF, '', len(source)))
     return tokens
 
 # ----------------------------------------------------------------------
 # AST Nodes
 # ----------------------------------------------------------------------
 
-@dataclass
+# Nodes are slotted: the parser allocates one per expression and the code
+# generator walks them repeatedly, so per-instance __dict__s add up.
+# __slots__ is declared by hand, as for Token, since dataclass(slots=True)
+# needs Python 3.10; a slot can't also hold a class-level default, so
+# fields have none.
+
 class ASTNode:
-    pass
+    __slots__ = ()
+
+# Shared argument list for unary sends, rather than a fresh [] per send
+NO_ARGS = ()
 
 @dataclass
 class LiteralNode(ASTNode):
+    __slots__ = ('type', 'value')
     type: str  # 'int', 'float', 'string', 'symbol'
     value: str
 
 @dataclass
 class VariableNode(ASTNode):
+    __slots__ = ('name',)
     name: str
 
 @dataclass
 class AssignNode(ASTNode):
+    __slots__ = ('name', 'value')
     name: str
     value: ASTNode
 
 @dataclass
 class SendNode(ASTNode):
+    __slots__ = ('receiver', 'selector', 'args')
     receiver: ASTNode
     selector: str
-    args: List[ASTNode]
+    args: Sequence[ASTNode]  # NO_ARGS for unary sends
 
 @dataclass
 class CascadeNode(ASTNode):
+    __slots__ = ('receiver', 'selectors', 'arg_lists')
     receiver: ASTNode
-    messages: List[Tuple[str, List[ASTNode]]]  # list of (selector, args)
+    selectors: List[str]  # one per message, in order
+    arg_lists: List[Sequence[ASTNode]]  # the args of each message
 
 @dataclass
 class ReturnNode(ASTNode):
+    __slots__ = ('value',)
     value: ASTNode
 
 @dataclass
 class BlockNode(ASTNode):
+    __slots__ = ('params', 'temps', 'body', 'body_start', 'body_end', 'has_early_return')
     params: List[str]
     temps: List[str]
     body: List[ASTNode]
-    body_start: int = 0  # position of first body token in source
-    body_end: int = 0    # position of ']' in source
-    has_early_return: bool = False  # True if block contains ^
+    body_start: int  # position of first body token in source
+    body_end: int    # position of ']' in source
+    has_early_return: bool  # True if block contains ^
 
 @dataclass
 class MethodNode(ASTNode):
+    __slots__ = ('selector', 'params', 'temps', 'body', 'has_early_return_block')
     selector: str
     params: List[str]
     temps: List[str]
     body: List[ASTNode]
+    has_early_return_block: bool  # True if any block in it contains ^
 
 # ----------------------------------------------------------------------
 # Parser
 # ----------------------------------------------------------------------
 
+# Literal token types and the LiteralNode type they parse to
+LITERAL_TYPES = {
+    T_INT: 'int',
+    T_FLOAT: 'float',
+    T_STRING: 'string',
+    T_SYMBOL: 'symbol',
+}
+
 class Parser:
     def __init__(self, tokens: List[Token], source: str = ''):
         self.tokens = tokens
         self.pos = 0
         self.source = source
+        self.saw_return = False  # a ^ statement in the body being parsed
+        self.saw_early_return_block = False  # a block containing ^, anywhere
+        
+        # Dispatch tables keyed by the type of the current token
+        self._pattern_parsers = {
+            T_NAME: self._parse_unary_pattern,
+            T_BINARY: self._parse_binary_pattern,
+            T_KEYWORD: self._parse_keyword_pattern,
+        }
+        self._cascade_message_parsers = {
+            T_NAME: self._parse_unary_message,
+            T_BINARY: self._parse_binary_message,
+            T_KEYWORD: self._parse_keyword_message,
+        }
+        self._primary_parsers = {
+            T_INT: self._parse_literal,
+            T_FLOAT: self._parse_literal,
+            T_STRING: self._parse_literal,
+            T_SYMBOL: self._parse_literal,
+            T_NAME: self._parse_variable,
+            T_LPAREN: self._parse_parenthesized,
+            T_LBRACKET: self.parse_block,
+        }
     
     def current(self) -> Token:
         return self.tokens[self.pos]
     
-    def peek(self, offset: int = 0) -> Token:
-        pos = self.pos + offset
-        if pos < len(self.tokens):
-            return self.tokens[pos]
-        return Token('EOF', '', 0)
-    
     def advance(self) -> Token:
         tok = self.current()
         self.pos += 1
         return tok
     
-    def expect(self, type: str) -> Token:
+    def expect(self, type: int) -> Token:
         tok = self.current()
         if tok.type != type:
-            raise SyntaxError(f"Expected {type}, got {tok.type} ({tok.value!r})")
+            raise SyntaxError(f"Expected {TOKEN_NAMES[type]}, got {TOKEN_NAMES[tok.type]} ({tok.value!r})")
         return self.advance()
     
     def parse_method(self) -> MethodNode:
@@ -281,72 +265,79 @@ class Parser:
         selector, params = self.parse_message_pattern()
         temps = self.parse_temporaries()
         body = self.parse_statements()
-        return MethodNode(selector, params, temps, body)
+        return MethodNode(selector, params, temps, body, self.saw_early_return_block)
     
     def parse_message_pattern(self) -> Tuple[str, List[str]]:
         """Parse method signature: unary, binary, or keyword"""
         tok = self.current()
-        
-        if tok.type == 'NAME':
-            # Unary
-            self.advance()
-            return (tok.value, [])
-        
-        elif tok.type == 'BINARY':
-            # Binary
-            sel = self.advance().value
-            param = self.expect('NAME').value
-            return (sel, [param])
-        
-        elif tok.type == 'KEYWORD':
-            # Keyword
-            selector = ''
-            params = []
-            while self.current().type == 'KEYWORD':
-                selector += self.advance().value
-                params.append(self.expect('NAME').value)
-            return (selector, params)
-        
-        else:
-            raise SyntaxError(f"Expected message pattern, got {tok.type}")
+        parse = self._pattern_parsers.get(tok.type)
+        if parse is None:
+            raise SyntaxError(f"Expected message pattern, got {TOKEN_NAMES[tok.type]}")
+        return parse()
+    
+    def _parse_unary_pattern(self) -> Tuple[str, List[str]]:
+        return (self.advance().value, [])
+    
+    def _parse_binary_pattern(self) -> Tuple[str, List[str]]:
+        sel = self.advance().value
+        param = self.expect(T_NAME).value
+        return (sel, [param])
+    
+    def _parse_keyword_pattern(self) -> Tuple[str, List[str]]:
+        tokens = self.tokens
+        selector = ''
+        params = []
+        while tokens[self.pos].type == T_KEYWORD:
+            selector += tokens[self.pos].value
+            self.pos += 1
+            params.append(self.expect(T_NAME).value)
+        return (selector, params)
     
     def parse_temporaries(self) -> List[str]:
         """Parse | temp1 temp2 | declarations"""
+        tokens = self.tokens
+        pos = self.pos
         temps = []
-        if self.current().type == 'BAR':
-            self.advance()
-            while self.current().type == 'NAME':
-                temps.append(self.advance().value)
-            self.expect('BAR')
+        if tokens[pos].type == T_BAR:
+            pos += 1
+            while tokens[pos].type == T_NAME:
+                temps.append(tokens[pos].value)
+                pos += 1
+            self.pos = pos
+            self.expect(T_BAR)
         return temps
     
     def parse_statements(self) -> List[ASTNode]:
         """Parse a sequence of statements separated by dots"""
+        tokens = self.tokens
         stmts = []
-        while self.current().type not in ('EOF', 'RBRACKET'):
+        while tokens[self.pos].type not in (T_EOF, T_RBRACKET):
             stmt = self.parse_statement()
             if stmt:
                 stmts.append(stmt)
-            if self.current().type == 'DOT':
-                self.advance()
+            if tokens[self.pos].type == T_DOT:
+                self.pos += 1
             else:
                 break
         return stmts
     
     def parse_statement(self) -> Optional[ASTNode]:
         """Parse a single statement (return or expression)"""
-        if self.current().type == 'CARET':
-            self.advance()
+        if self.tokens[self.pos].type == T_CARET:
+            self.pos += 1
+            self.saw_return = True
             return ReturnNode(self.parse_expression())
         else:
             return self.parse_expression()
     
     def parse_expression(self) -> ASTNode:
         """Parse expression, possibly with assignment"""
-        # Check for assignment: name := expr
-        if self.current().type == 'NAME' and self.peek(1).type == 'ASSIGN':
-            name = self.advance().value
-            self.advance()  # skip :=
+        # Check for assignment: name := expr (a NAME is never the last token)
+        tokens = self.tokens
+        pos = self.pos
+        if tokens[pos].type == T_NAME and tokens[pos + 1].type == T_ASSIGN:
+            name = tokens[pos].value
+            self.pos = pos + 2  # skip name :=
             value = self.parse_expression()
             return AssignNode(name, value)
         
@@ -356,72 +347,94 @@ class Parser:
         """Parse cascaded messages: recv msg1; msg2; msg3"""
         expr = self.parse_keyword_send()
         
-        if self.current().type == 'SEMI':
+        tokens = self.tokens
+        if tokens[self.pos].type == T_SEMI:
             # We have a cascade - need to extract receiver and first message
             if not isinstance(expr, SendNode):
                 raise SyntaxError("Cascade requires a message send")
             
-            messages = [(expr.selector, expr.args)]
-            receiver = expr.receiver
+            selectors = [expr.selector]
+            arg_lists = [expr.args]
             
-            while self.current().type == 'SEMI':
-                self.advance()
+            while tokens[self.pos].type == T_SEMI:
+                self.pos += 1
                 sel, args = self.parse_cascade_message()
-                messages.append((sel, args))
+                selectors.append(sel)
+                arg_lists.append(args)
             
-            return CascadeNode(receiver, messages)
+            return CascadeNode(expr.receiver, selectors, arg_lists)
         
         return expr
     
-    def parse_cascade_message(self) -> Tuple[str, List[ASTNode]]:
+    def parse_cascade_message(self) -> Tuple[str, Sequence[ASTNode]]:
         """Parse a single message in a cascade (no receiver)"""
         tok = self.current()
-        
-        if tok.type == 'NAME':
-            # Unary
-            self.advance()
-            return (tok.value, [])
-        
-        elif tok.type == 'BINARY':
-            # Binary
-            sel = self.advance().value
-            arg = self.parse_unary_send()
-            return (sel, [arg])
-        
-        elif tok.type == 'KEYWORD':
-            # Keyword
-            selector = ''
-            args = []
-            while self.current().type == 'KEYWORD':
-                selector += self.advance().value
-                args.append(self.parse_binary_send())
-            return (selector, args)
-        
-        else:
-            raise SyntaxError(f"Expected message in cascade, got {tok.type}")
+        parse = self._cascade_message_parsers.get(tok.type)
+        if parse is None:
+            raise SyntaxError(f"Expected message in cascade, got {TOKEN_NAMES[tok.type]}")
+        return parse()
+    
+    def _parse_unary_message(self) -> Tuple[str, Sequence[ASTNode]]:
+        return (self.advance().value, NO_ARGS)
+    
+    def _parse_binary_message(self) -> Tuple[str, Sequence[ASTNode]]:
+        sel = self.advance().value
+        arg = self.parse_unary_send()
+        return (sel, [arg])
+    
+    def _parse_keyword_message(self) -> Tuple[str, Sequence[ASTNode]]:
+        tokens = self.tokens
+        selector = ''
+        args = []
+        while tokens[self.pos].type == T_KEYWORD:
+            selector += tokens[self.pos].value
+            self.pos += 1
+            args.append(self.parse_binary_send())
+        return (selector, args)
     
     def parse_keyword_send(self) -> ASTNode:
         """Parse keyword message: recv key1: arg1 key2: arg2"""
         receiver = self.parse_binary_send()
         
-        if self.current().type == 'KEYWORD':
-            selector = ''
-            args = []
-            while self.current().type == 'KEYWORD':
-                selector += self.advance().value
-                args.append(self.parse_binary_send())
-            return SendNode(receiver, selector, args)
-        
-        return receiver
+        tokens = self.tokens
+        tok = tokens[self.pos]
+        if tok.type != T_KEYWORD:
+            return receiver
+        
+        selector = ''
+        args = []
+        while tok.type == T_KEYWORD:
+            selector += tok.value
+            self.pos += 1
+            args.append(self.parse_binary_send())
+            tok = tokens[self.pos]
+        return SendNode(receiver, selector, args)
     
     def parse_binary_send(self) -> ASTNode:
-        """Parse binary message: recv + arg"""
-        receiver = self.parse_unary_send()
+        """Parse binary message: recv + arg
+        
+        The unary sends on each operand are parsed inline rather than through
+        parse_unary_send, saving a call per operand in long binary chains.
+        """
+        tokens = self.tokens
         
-        while self.current().type == 'BINARY':
-            selector = self.advance().value
-            arg = self.parse_unary_send()
+        # A NAME is never the last token (EOF is), so pos + 1 is always valid
+        receiver = self.parse_primary()
+        pos = self.pos
+        while tokens[pos].type == T_NAME and tokens[pos + 1].type != T_ASSIGN:
+            receiver = SendNode(receiver, tokens[pos].value, NO_ARGS)
+            pos += 1
+        
+        while tokens[pos].type == T_BINARY:
+            selector = tokens[pos].value
+            self.pos = pos + 1
+            arg = self.parse_primary()
+            pos = self.pos
+            while tokens[pos].type == T_NAME and tokens[pos + 1].type != T_ASSIGN:
+                arg = SendNode(arg, tokens[pos].value, NO_ARGS)
+                pos += 1
             receiver = SendNode(receiver, selector, [arg])
+        self.pos = pos
         
         return receiver
     
@@ -429,136 +442,192 @@ class Parser:
         """Parse unary message: recv msg"""
         receiver = self.parse_primary()
         
-        while self.current().type == 'NAME' and self.peek(1).type != 'ASSIGN':
-            # Make sure it's not a keyword by checking next isn't ':'
-            selector = self.advance().value
-            receiver = SendNode(receiver, selector, [])
+        tokens = self.tokens
+        pos = self.pos
+        while tokens[pos].type == T_NAME and tokens[pos + 1].type != T_ASSIGN:
+            receiver = SendNode(receiver, tokens[pos].value, NO_ARGS)
+            pos += 1
+        self.pos = pos
         
         return receiver
     
     def parse_primary(self) -> ASTNode:
         """Parse primary: literal, variable, block, or (expr)"""
         tok = self.current()
-        
-        if tok.type == 'INT':
-            self.advance()
-            return LiteralNode('int', tok.value)
-        
-        elif tok.type == 'FLOAT':
-            self.advance()
-            return LiteralNode('float', tok.value)
-        
-        elif tok.type == 'STRING':
-            self.advance()
-            return LiteralNode('string', tok.value)
-        
-        elif tok.type == 'SYMBOL':
-            self.advance()
-            return LiteralNode('symbol', tok.value)
-        
-        elif tok.type == 'NAME':
-            self.advance()
-            return VariableNode(tok.value)
-        
-        elif tok.type == 'LPAREN':
-            self.advance()
-            expr = self.parse_expression()
-            self.expect('RPAREN')
-            return expr
-        
-        elif tok.type == 'LBRACKET':
-            return self.parse_block()
-        
-        else:
-            raise SyntaxError(f"Unexpected token in primary: {tok.type} ({tok.value!r})")
+        parse = self._primary_parsers.get(tok.type)
+        if parse is None:
+            raise SyntaxError(f"Unexpected token in primary: {TOKEN_NAMES[tok.type]} ({tok.value!r})")
+        return parse()
+    
+    def _parse_literal(self) -> LiteralNode:
+        tok = self.advance()
+        return LiteralNode(LITERAL_TYPES[tok.type], tok.value)
+    
+    def _parse_variable(self) -> VariableNode:
+        return VariableNode(self.advance().value)
+    
+    def _parse_parenthesized(self) -> ASTNode:
+        self.advance()
+        expr = self.parse_expression()
+        self.expect(T_RPAREN)
+        return expr
     
     def parse_block(self) -> BlockNode:
         """Parse a block: [ :param1 :param2 | | temps | statements ]"""
+        tokens = self.tokens
         start_tok = self.current()
         source_start = start_tok.pos
-        self.expect('LBRACKET')
+        self.expect(T_LBRACKET)
         
         # Parse block parameters :param1 :param2 ... |
+        pos = self.pos
         params = []
-        while self.current().type == 'BLOCKPARAM':
-            params.append(self.advance().value)
+        while tokens[pos].type == T_BLOCKPARAM:
+            params.append(tokens[pos].value)
+            pos += 1
+        self.pos = pos
         
         # If we had params, expect a | to end them
         if params:
-            self.expect('BAR')
+            self.expect(T_BAR)
         
         # Parse temporaries (optional)
-        temps = []
-        if self.current().type == 'BAR':
-            self.advance()
-            while self.current().type == 'NAME':
-                temps.append(self.advance().value)
-            self.expect('BAR')
+        temps = self.parse_temporaries()
         
         # Record where body starts (after params and temps)
-        body_start = self.current().pos
+        body_start = tokens[self.pos].pos
         
-        # Parse statements until ]
+        # Parse statements until ]; returns in nested blocks are their own
+        outer_saw_return = self.saw_return
+        self.saw_return = False
         body = []
-        while self.current().type != 'RBRACKET':
+        while tokens[self.pos].type != T_RBRACKET:
             stmt = self.parse_statement()
             if stmt:
                 body.append(stmt)
-            if self.current().type == 'DOT':
-                self.advance()
+            if tokens[self.pos].type == T_DOT:
+                self.pos += 1
         
-        end_tok = self.current()
+        end_tok = tokens[self.pos]
         body_end = end_tok.pos  # position of ], not including it
         source_end = end_tok.pos + 1  # include the ]
-        self.expect('RBRACKET')
+        self.expect(T_RBRACKET)
         
-        # Check if block body contains an early return
-        has_early_return = self._contains_return(body)
+        # A ^ statement in the block body is an early return
+        has_early_return = self.saw_return
+        self.saw_return = outer_saw_return
+        if has_early_return:
+            self.saw_early_return_block = True
         
         return BlockNode(params, temps, body, body_start, body_end, has_early_return)
-    
-    def _contains_return(self, nodes: List[ASTNode]) -> bool:
-        """Check if any node in the list is or contains a ReturnNode."""
-        for node in nodes:
-            if isinstance(node, ReturnNode):
-                return True
-            elif isinstance(node, SendNode):
-                if self._contains_return(node.args):
-                    return True
-            elif isinstance(node, AssignNode):
-                if self._contains_return([node.value]):
-                    return True
-            elif isinstance(node, CascadeNode):
-                for _, args in node.messages:
-                    if self._contains_return(args):
-                        return True
-            elif isinstance(node, BlockNode):
-                # Don't recurse into nested blocks - their returns are their own
-                pass
-        return False
 
 # ----------------------------------------------------------------------
 # Code Generator
 # ----------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=None)
+def mangle_selector(selector: str) -> str:
+    """Translate a selector to its method filename: at:put: -> at-put-
+    
+    The same few selectors recur in every method, so each is translated once.
+    """
+    return selector.replace(':', '-')
+
+def comment_out(text: str) -> str:
+    """Turn every line of text into a Bash comment line"""
+    return "# " + text.replace('\n', '\n# ')
+
+# Bash line templates, one per shape of emitted line. They are filled in
+# with % rather than str.format, which is several times slower for a
+# handful of fields; each lists its fields alongside
+TMPL_COMMENT = "# %s"                                  # line
+TMPL_PARAM = "%s=$%s"                                  # name, index
+TMPL_ASSIGN = "%s=%s"                                  # target, value
+TMPL_ECHO = "echo %s"                                  # value
+TMPL_IVAR_READ = "{ read -r %s || :; } < $self/%s"     # target, name
+TMPL_IVAR_CAT = "cat $self/%s"                         # name
+TMPL_IVAR_WRITE = "echo %s > $self/%s"                 # value, name
+TMPL_SEND_FINAL = "./send %s %s"                       # recv, message
+TMPL_SEND_CAPTURE = "%s=$(./send %s %s)"               # target, recv, message
+TMPL_SEND_DISCARD = "_=$(./send %s %s)"                # recv, message
+TMPL_EARLY_RETURN = "echo %s > $SMALLTIX_RETURN_FILE"  # value
+
+# Array with- ... with-with-with-with-, indexed by the number of elements;
+# larger arrays are built with new- and at-put-
+ARRAY_WITH_SELECTORS = [None] + ["with-" * n for n in range(1, 5)]
+
+# Temporary names, preformatted: TMP_NAMES[n] == "tmpN" (formatted on the
+# fly past the end, which few methods reach)
+TMP_NAMES = tuple(f"tmp{i}" for i in range(64))
+
+# Where generated code delivers an expression's value
+(SINK_TMP,     # a Bash reference, captured into a fresh tmp if need be
+ SINK_INTO,    # assigned to a named variable
+ SINK_FINAL,   # written to stdout as the method's result
+ SINK_DISCARD, # not needed: only the side effects are kept
+ ) = range(4)
+
+# Emitted once at the top of any method containing a block with a ^ return
+EARLY_RETURN_PRELUDE = [
+    "",
+    "# Early return infrastructure",
+    'export SMALLTIX_RETURN_FILE="/tmp/smalltix_return_$$"',
+    "",
+    "smalltix_handle_return() {",
+    "    if [[ -s $SMALLTIX_RETURN_FILE ]]; then",
+    "        cat $SMALLTIX_RETURN_FILE",
+    '        rm -f "$SMALLTIX_RETURN_FILE"',
+    "        exit 0",
+    "    else",
+    "        exit 2",
+    "    fi",
+    "}",
+    "trap 'smalltix_handle_return' ERR",
+    'trap \'rm -f "$SMALLTIX_RETURN_FILE"\' EXIT',
+    "",
+]
+
 class CodeGenerator:
     def __init__(self, source: str = ''):
         self.source = source
         self.tmp_counter = 0
-        self.lines = []
-        self.temps = set()  # track declared temporaries
-        self.params = set()  # track method parameters
-        self.inst_vars = set()  # will be populated by context
+        self.lines: List[str] = []
+        self.temps: Set[str] = set()  # track declared temporaries
+        self.params: Set[str] = set()  # track method parameters
+        self.var_refs: Dict[str, Optional[str]] = {}  # name -> Bash reference, None for an ivar
+        self.inst_vars: Set[str] = set()  # will be populated by context
         self.block_counter = 0
-        self.extracted_blocks = []  # list of (name, source, bash) tuples
+        self.extracted_blocks: List[Tuple[str, str]] = []  # list of (name, bash) tuples
         self.method_selector = ''  # current method's selector (mangled)
-        self.block_path_stack = []  # for nested blocks: stack of block name suffixes
+        self.block_path_stack: List[str] = []  # for nested blocks: stack of block name suffixes
         self.in_block = False  # True when generating code inside a block
         self.method_has_early_return = False  # True if any block has early return
+        
+        # Dispatch table keyed by AST node class
+        self._generators = {
+            LiteralNode: self._generate_literal,
+            VariableNode: self._generate_variable,
+            AssignNode: self._generate_assign,
+            SendNode: self._generate_send,
+            CascadeNode: self._generate_cascade,
+            BlockNode: self._generate_block_value,
+        }
+        self._renderers = {
+            LiteralNode: self._render_literal,
+            VariableNode: self._render_variable,
+            AssignNode: self._render_assign,
+            SendNode: self._render_send,
+            CascadeNode: self._render_cascade,
+            ReturnNode: self._render_return,
+            BlockNode: self._render_block,
+        }
     
     def new_tmp(self) -> str:
         self.tmp_counter += 1
-        return f"tmp{self.tmp_counter}"
+        n = self.tmp_counter
+        if n < len(TMP_NAMES):
+            return TMP_NAMES[n]
+        return f"tmp{n}"
     
     def new_block_name(self) -> str:
         self.block_counter += 1
@@ -571,106 +640,40 @@ class CodeGenerator:
         """Return the full block path suffix for nested blocks"""
         return ''.join(self.block_path_stack)
     
-    def needs_dollar_prefix(self, var_name: str) -> bool:
-        """Check if a variable reference needs $ prefix in Bash.
-        
-        Returns False for literals (int/, float/), special values (true, false, nil),
-        and global class references (capitalized names).
-        """
-        if var_name.startswith(('int/', 'float/')):
-            return False
-        if var_name in ('true', 'false', 'nil'):
-            return False
-        if var_name and var_name[0].isupper():
-            return False
-        return True
-    
-    def var_ref(self, var_name: str) -> str:
-        """Return the Bash reference for a variable (with or without $)."""
-        if self.needs_dollar_prefix(var_name):
-            return f"${var_name}"
-        return var_name
-    
-    def _method_contains_early_return(self, body: List[ASTNode]) -> bool:
-        """Check if any block in the method body contains an early return."""
-        for node in body:
-            if self._node_has_early_return_block(node):
-                return True
-        return False
-    
-    def _node_has_early_return_block(self, node: ASTNode) -> bool:
-        """Recursively check if a node contains a block with an early return."""
-        if isinstance(node, BlockNode):
-            if node.has_early_return:
-                return True
-            # Also check nested blocks within this block's body
-            for stmt in node.body:
-                if self._node_has_early_return_block(stmt):
-                    return True
-        elif isinstance(node, SendNode):
-            for arg in node.args:
-                if self._node_has_early_return_block(arg):
-                    return True
-        elif isinstance(node, AssignNode):
-            if self._node_has_early_return_block(node.value):
-                return True
-        elif isinstance(node, CascadeNode):
-            for _, args in node.messages:
-                for arg in args:
-                    if self._node_has_early_return_block(arg):
-                        return True
-        elif isinstance(node, ReturnNode):
-            if self._node_has_early_return_block(node.value):
-                return True
-        return False
-    
     def generate_method(self, node: MethodNode, original_source: str) -> Tuple[str, List[Tuple[str, str]]]:
         """Generate complete Bash method script.
         
         Returns: (main_script, [(block_name, block_script), ...])
         """
         self.lines = []
+        emit = self.lines.append
         self.temps = set(node.temps)
         self.params = set(node.params)
-        self.method_selector = node.selector.replace(':', '-')
+        self.var_refs = {}
+        self.method_selector = mangle_selector(node.selector)
         self.block_counter = 0
         self.extracted_blocks = []
         self.block_path_stack = []
         self.in_block = False
         
-        # Check if any block in this method has an early return
-        self.method_has_early_return = self._method_contains_early_return(node.body)
+        # The parser has already noted whether any block has an early return
+        self.method_has_early_return = node.has_early_return_block
         
-        # Include original source verbatim as comments
-        for line in original_source.rstrip().split('\n'):
-            self.lines.append(f"# {line}")
-        self.lines.append("#")
+        # Include original source verbatim as comments, commenting out
+        # every line in one replace rather than line by line
+        emit(comment_out(original_source.rstrip()))
+        emit("#")
         
         # self=$1
-        self.lines.append("self=$1")
+        emit("self=$1")
         
         # Parameters: param1=$2, param2=$3, etc.
         for i, param in enumerate(node.params, start=2):
-            self.lines.append(f"{param}=${i}")
+            emit(TMPL_PARAM % (param, i))
         
         # If any block has early return, emit infrastructure
         if self.method_has_early_return:
-            self.lines.append("")
-            self.lines.append("# Early return infrastructure")
-            self.lines.append('export SMALLTIX_RETURN_FILE="/tmp/smalltix_return_$$"')
-            self.lines.append("")
-            self.lines.append("smalltix_handle_return() {")
-            self.lines.append("    if [[ -s $SMALLTIX_RETURN_FILE ]]; then")
-            self.lines.append("        cat $SMALLTIX_RETURN_FILE")
-            self.lines.append('        rm -f "$SMALLTIX_RETURN_FILE"')
-            self.lines.append("        exit 0")
-            self.lines.append("    else")
-            self.lines.append("        exit 2")
-            self.lines.append("    fi")
-            self.lines.append("}")
-            self.lines.append("trap 'smalltix_handle_return' ERR")
-            self.lines.append('trap \'rm -f "$SMALLTIX_RETURN_FILE"\' EXIT')
-            self.lines.append("")
+            self.lines.extend(EARLY_RETURN_PRELUDE)
         
         # Generate body - handle final return specially for optimization
         for i, stmt in enumerate(node.body):
@@ -680,111 +683,106 @@ class CodeGenerator:
         main_script = '\n'.join(self.lines)
         return (main_script, self.extracted_blocks)
     
-    def reconstruct_source(self, node: MethodNode) -> List[str]:
-        """Reconstruct original Smalltalk source for comment header"""
-        lines = []
+    def node_to_source(self, node: ASTNode) -> str:
+        """Convert AST node back to Smalltalk source
         
-        # Temporaries
+        Not used when generating code: the comment headers quote the original
+        source verbatim, so the AST is only walked once per method. This is
+        for rendering individual nodes on demand (e.g. when debugging).
+        """
+        out = []
+        self._render(node, out)
+        return ''.join(out)
+    
+    def _render(self, node: ASTNode, out: List[str]) -> None:
+        """Append the source pieces of node to out"""
+        renderer = self._renderers.get(type(node))
+        if renderer is None:
+            out.append("???")
+        else:
+            renderer(node, out)
+    
+    def _render_literal(self, node: LiteralNode, out: List[str]) -> None:
+        if node.type == 'string':
+            out.append(f"'{node.value}'")
+        elif node.type == 'symbol':
+            out.append(f"#{node.value}")
+        else:
+            out.append(node.value)
+    
+    def _render_variable(self, node: VariableNode, out: List[str]) -> None:
+        out.append(node.name)
+    
+    def _render_assign(self, node: AssignNode, out: List[str]) -> None:
+        out.append(f"{node.name} := ")
+        self._render(node.value, out)
+    
+    def _render_send(self, node: SendNode, out: List[str]) -> None:
+        # Add parens if receiver is complex
+        parens = isinstance(node.receiver, (SendNode, AssignNode)) and self.is_keyword_or_binary(node.receiver)
+        if parens:
+            out.append("(")
+        self._render(node.receiver, out)
+        if parens:
+            out.append(")")
+        self._render_message(node.selector, node.args, out)
+    
+    def _render_cascade(self, node: CascadeNode, out: List[str]) -> None:
+        self._render(node.receiver, out)
+        for i, (sel, args) in enumerate(zip(node.selectors, node.arg_lists)):
+            if i > 0:
+                out.append(" ;")
+            self._render_message(sel, args, out)
+    
+    def _render_return(self, node: ReturnNode, out: List[str]) -> None:
+        out.append("^ ")
+        self._render(node.value, out)
+    
+    def _render_block(self, node: BlockNode, out: List[str]) -> None:
+        out.append("[")
+        if node.params:
+            for p in node.params:
+                out.append(f" :{p}")
+            out.append(" |")
         if node.temps:
-            lines.append("| " + " ".join(node.temps) + " |")
-        
-        # Body statements
-        for stmt in node.body:
-            lines.append(self.node_to_source(stmt))
-        
-        return lines
+            out.append(" |")
+            for t in node.temps:
+                out.append(f" {t}")
+            out.append(" |")
+        for i, stmt in enumerate(node.body):
+            out.append(" ." if i > 0 else "")
+            out.append(" ")
+            self._render(stmt, out)
+        out.append(" ]")
     
-    def node_to_source(self, node: ASTNode) -> str:
-        """Convert AST node back to Smalltalk source"""
-        if isinstance(node, LiteralNode):
-            if node.type == 'int':
-                return node.value
-            elif node.type == 'float':
-                return node.value
-            elif node.type == 'string':
-                return f"'{node.value}'"
-            elif node.type == 'symbol':
-                return f"#{node.value}"
-        
-        elif isinstance(node, VariableNode):
-            return node.name
-        
-        elif isinstance(node, AssignNode):
-            return f"{node.name} := {self.node_to_source(node.value)}"
-        
-        elif isinstance(node, SendNode):
-            recv = self.node_to_source(node.receiver)
-            # Add parens if receiver is complex
-            if isinstance(node.receiver, (SendNode, AssignNode)):
-                if self.is_keyword_or_binary(node.receiver):
-                    recv = f"({recv})"
-            
-            if not node.args:
-                # Unary
-                return f"{recv} {node.selector}"
-            elif len(node.args) == 1 and not node.selector.endswith(':'):
-                # Binary
-                return f"{recv} {node.selector} {self.node_to_source(node.args[0])}"
-            else:
-                # Keyword
-                parts = node.selector.split(':')[:-1]  # remove trailing empty
-                result = recv
-                for part, arg in zip(parts, node.args):
-                    result += f" {part}: {self.node_to_source(arg)}"
-                return result
-        
-        elif isinstance(node, CascadeNode):
-            recv = self.node_to_source(node.receiver)
-            parts = [recv]
-            for i, (sel, args) in enumerate(node.messages):
-                if i > 0:
-                    parts.append(";")
-                if not args:
-                    parts.append(sel)
-                elif len(args) == 1 and not sel.endswith(':'):
-                    parts.append(f"{sel} {self.node_to_source(args[0])}")
-                else:
-                    kw_parts = sel.split(':')[:-1]
-                    for kp, arg in zip(kw_parts, args):
-                        parts.append(f"{kp}: {self.node_to_source(arg)}")
-            return " ".join(parts)
-        
-        elif isinstance(node, ReturnNode):
-            return f"^ {self.node_to_source(node.value)}"
-        
-        elif isinstance(node, BlockNode):
-            parts = ["["]
-            if node.params:
-                for p in node.params:
-                    parts.append(f":{p}")
-                parts.append("|")
-            if node.temps:
-                parts.append("|")
-                parts.extend(node.temps)
-                parts.append("|")
-            for stmt in node.body:
-                parts.append(self.node_to_source(stmt))
-                parts.append(".")
-            # Remove trailing dot
-            if parts[-1] == ".":
-                parts.pop()
-            parts.append("]")
-            return " ".join(parts)
-        
-        return "???"
+    def _render_message(self, selector: str, args: Sequence[ASTNode], out: List[str]) -> None:
+        """Append a message (without its receiver) to out"""
+        if not args:
+            # Unary
+            out.append(f" {selector}")
+        elif len(args) == 1 and not selector.endswith(':'):
+            # Binary
+            out.append(f" {selector} ")
+            self._render(args[0], out)
+        else:
+            # Keyword
+            parts = selector.split(':')[:-1]  # remove trailing empty
+            for part, arg in zip(parts, args):
+                out.append(f" {part}: ")
+                self._render(arg, out)
     
     def is_keyword_or_binary(self, node: ASTNode) -> bool:
         if isinstance(node, SendNode):
             return len(node.args) > 0
         return False
     
-    def generate_statement(self, node: ASTNode, is_final: bool = False) -> str:
-        """Generate code for a statement, return the variable holding result"""
+    def generate_statement(self, node: ASTNode, is_final: bool = False) -> Optional[str]:
+        """Generate code for a statement, return the Bash reference to its result"""
         if isinstance(node, ReturnNode):
             if self.in_block:
                 # Early return from block - write to return file and exit
                 result = self.generate_expr(node.value)
-                self.lines.append(f"echo {self.var_ref(result)} > $SMALLTIX_RETURN_FILE")
+                self.lines.append(TMPL_EARLY_RETURN % result)
                 self.lines.append("exit 1")
                 return None
             elif is_final:
@@ -793,294 +791,182 @@ class CodeGenerator:
                 return None
             else:
                 result = self.generate_expr(node.value)
-                self.lines.append(f"echo {self.var_ref(result)}")
+                self.lines.append(TMPL_ECHO % result)
                 return result
         else:
             if is_final:
                 # Final expression in a block - output directly
                 self.generate_expr_final(node)
-                return None
             else:
-                return self.generate_expr(node)
+                # Nothing refers to a statement's value
+                self.generate(node, SINK_DISCARD)
+            return None
     
     def generate_expr_final(self, node: ASTNode) -> None:
         """Generate expression as final statement - output directly without capturing"""
-        if isinstance(node, LiteralNode):
-            if node.type == 'int':
-                self.lines.append(f"echo int/{node.value}")
-            elif node.type == 'float':
-                self.lines.append(f"echo float/{node.value}")
-            else:
-                raise NotImplementedError(f"{node.type} literals not yet supported")
-        
-        elif isinstance(node, VariableNode):
-            name = node.name
-            if name == 'self':
-                self.lines.append("echo $self")
-            elif name in ('true', 'false', 'nil'):
-                self.lines.append(f"echo {name}")
-            elif name in self.temps or name in self.params:
-                self.lines.append(f"echo ${name}")
-            else:
-                # Instance variable
-                self.lines.append(f"cat $self/{name}")
-        
-        elif isinstance(node, SendNode):
-            self.generate_send_final(node)
-        
-        elif isinstance(node, CascadeNode):
-            self.generate_cascade_final(node)
-        
-        elif isinstance(node, AssignNode):
-            # Assignment as final expression - do assignment, then output value
-            result = self.generate_expr(node)
-            self.lines.append(f"echo {self.var_ref(result)}")
+        self.generate(node, SINK_FINAL)
+    
+    def generate_args(self, args: Sequence[ASTNode]) -> str:
+        """Generate the arguments of a send, return their references space-separated"""
+        # Nearly every send has at most two arguments: skip the join for those
+        n = len(args)
+        if n == 0:
+            return ''
+        if n == 1:
+            return self.generate_expr(args[0])
+        if n == 2:
+            first = self.generate_expr(args[0])
+            return f"{first} {self.generate_expr(args[1])}"
+        return ' '.join([self.generate_expr(arg) for arg in args])
+    
+    def generate_expr(self, node: ASTNode) -> str:
+        """Generate code for expression, return the Bash reference to its result.
         
-        elif isinstance(node, BlockNode):
-            # Block as final expression - generate block, then output it
-            result = self.generate_block(node)
-            self.lines.append(f"echo {self.var_ref(result)}")
+        The reference is ready to splice into a command: "$tmp1" or "$aCanvas"
+        for variables, "int/3", "nil" or "Rectangle" for values that need no
+        expansion. Deciding this where the value is produced means callers
+        never have to re-classify names.
+        """
+        return self.generate(node, SINK_TMP)
+    
+    def generate(self, node: ASTNode, sink: int, target: Optional[str] = None) -> Optional[str]:
+        """Generate code for expression and deliver its value to sink
         
-        else:
+        Returns the Bash reference to the value, or None for SINK_FINAL.
+        """
+        generate = self._generators.get(type(node))
+        if generate is None:
             raise NotImplementedError(f"Unknown node type: {type(node)}")
+        return generate(node, sink, target)
     
-    def generate_send_final(self, node: SendNode) -> None:
-        """Generate a message send as final statement - no capture"""
-        recv_var = self.generate_expr(node.receiver)
-        
-        # Generate arguments
-        arg_vars = []
-        for arg in node.args:
-            arg_vars.append(self.generate_expr(arg))
-        
-        # Build selector (replace : with -)
-        selector = node.selector.replace(':', '-')
-        
-        # Build send command - no capture
-        args_str = ' '.join(self.var_ref(v) for v in arg_vars)
-        recv_ref = self.var_ref(recv_var)
-        
-        if args_str:
-            self.lines.append(f"./send {recv_ref} {selector} {args_str}")
-        else:
-            self.lines.append(f"./send {recv_ref} {selector}")
+    def _deliver(self, value: str, sink: int, target: Optional[str]) -> Optional[str]:
+        """Deliver a value that is already a Bash reference to sink"""
+        if sink == SINK_TMP:
+            return value
+        if sink == SINK_INTO:
+            self.lines.append(TMPL_ASSIGN % (target, value))
+            return f"${target}"
+        if sink == SINK_FINAL:
+            self.lines.append(TMPL_ECHO % value)
+        return None
     
-    def generate_cascade_final(self, node: CascadeNode) -> None:
-        """Generate cascaded messages as final statement"""
-        recv_var = self.generate_expr(node.receiver)
-        
-        for i, (selector, args) in enumerate(node.messages):
-            is_last_msg = (i == len(node.messages) - 1)
-            
-            arg_vars = []
-            for arg in args:
-                arg_vars.append(self.generate_expr(arg))
-            
-            selector = selector.replace(':', '-')
-            recv_ref = self.var_ref(recv_var)
-            args_str = ' '.join(self.var_ref(v) for v in arg_vars)
-            
-            if is_last_msg:
-                # Final message - no capture
-                if args_str:
-                    self.lines.append(f"./send {recv_ref} {selector} {args_str}")
-                else:
-                    self.lines.append(f"./send {recv_ref} {selector}")
-            else:
-                # Non-final message in cascade - capture (though result is discarded)
-                tmp = self.new_tmp()
-                if args_str:
-                    self.lines.append(f"{tmp}=$(./send {recv_ref} {selector} {args_str})")
-                else:
-                    self.lines.append(f"{tmp}=$(./send {recv_ref} {selector})")
+    def _send(self, recv_ref: str, message: str, sink: int, target: Optional[str]) -> Optional[str]:
+        """Emit one ./send process, delivering its result to sink"""
+        if sink == SINK_FINAL:
+            self.lines.append(TMPL_SEND_FINAL % (recv_ref, message))
+            return None
+        if sink == SINK_DISCARD:
+            # Still sent for its side effects. The output goes to a throwaway _
+            # rather than /dev/null: a ^ return out of a block relies on the
+            # send running inside a command substitution
+            self.lines.append(TMPL_SEND_DISCARD % (recv_ref, message))
+            return None
+        if sink == SINK_TMP:
+            target = self.new_tmp()
+        self.lines.append(TMPL_SEND_CAPTURE % (target, recv_ref, message))
+        return f"${target}"
     
-    def generate_expr(self, node: ASTNode) -> str:
-        """Generate code for expression, return variable name holding result"""
-        
-        if isinstance(node, LiteralNode):
-            if node.type == 'int':
-                return f"int/{node.value}"
-            elif node.type == 'float':
-                return f"float/{node.value}"
-            elif node.type == 'string':
-                raise NotImplementedError("String literals not yet supported")
-            elif node.type == 'symbol':
-                raise NotImplementedError("Symbol literals not yet supported")
-        
-        elif isinstance(node, VariableNode):
-            name = node.name
-            if name == 'self':
-                return 'self'
-            elif name == 'true':
-                return 'true'
-            elif name == 'false':
-                return 'false'
-            elif name == 'nil':
-                return 'nil'
-            elif name in self.temps or name in self.params:
-                return name
-            elif name[0].isupper():
-                # Capitalized names are global class references
-                return name
-            else:
-                # Instance variable - read from file
-                tmp = self.new_tmp()
-                self.lines.append(f"{tmp}=$(cat $self/{name})")
-                return tmp
-        
-        elif isinstance(node, AssignNode):
-            name = node.name
-            if name in self.temps or name in self.params:
-                # Local variable assignment - generate directly into this name
-                self.generate_expr_into(node.value, name)
-                return name
-            else:
-                # Instance variable assignment
-                value_var = self.generate_expr(node.value)
-                self.lines.append(f"echo {self.var_ref(value_var)} > $self/{name}")
-                return value_var
-        
-        elif isinstance(node, SendNode):
-            return self.generate_send(node)
-        
-        elif isinstance(node, CascadeNode):
-            return self.generate_cascade(node)
-        
-        elif isinstance(node, BlockNode):
-            return self.generate_block(node)
+    def _generate_literal(self, node: LiteralNode, sink: int, target: Optional[str]) -> Optional[str]:
+        if node.type == 'int':
+            return self._deliver(f"int/{node.value}", sink, target)
+        elif node.type == 'float':
+            return self._deliver(f"float/{node.value}", sink, target)
+        raise NotImplementedError(f"{node.type} literals not yet supported")
+    
+    def var_ref(self, name: str) -> Optional[str]:
+        """Bash reference to a variable, or None for an instance variable
         
+        A name means the same thing everywhere in a scope, so each is
+        classified once per method or block.
+        """
+        try:
+            return self.var_refs[name]
+        except KeyError:
+            pass
+        if name == 'self':
+            ref = '$self'
+        elif name in ('true', 'false', 'nil'):
+            ref = name
+        elif name in self.temps or name in self.params:
+            ref = f"${name}"
+        elif name[0].isupper():
+            # Capitalized names are global class references
+            ref = name
         else:
-            raise NotImplementedError(f"Unknown node type: {type(node)}")
+            ref = None
+        self.var_refs[name] = ref
+        return ref
     
-    def generate_expr_into(self, node: ASTNode, target_var: str) -> None:
-        """Generate expression, storing result directly into target_var"""
-        
-        if isinstance(node, LiteralNode):
-            if node.type == 'int':
-                self.lines.append(f"{target_var}=int/{node.value}")
-            elif node.type == 'float':
-                self.lines.append(f"{target_var}=float/{node.value}")
-            else:
-                raise NotImplementedError(f"{node.type} literals not yet supported")
-        
-        elif isinstance(node, VariableNode):
+    def _generate_variable(self, node: VariableNode, sink: int, target: Optional[str]) -> Optional[str]:
+        value = self.var_ref(node.name)
+        if value is None:
+            # Instance variable - read from file
             name = node.name
-            if name == 'self':
-                self.lines.append(f"{target_var}=$self")
-            elif name in ('true', 'false', 'nil'):
-                self.lines.append(f"{target_var}={name}")
-            elif name in self.temps or name in self.params:
-                self.lines.append(f"{target_var}=${name}")
-            elif name[0].isupper():
-                # Capitalized names are global class references
-                self.lines.append(f"{target_var}={name}")
-            else:
-                # Instance variable
-                self.lines.append(f"{target_var}=$(cat $self/{name})")
-        
-        elif isinstance(node, SendNode):
-            recv_var = self.generate_expr(node.receiver)
-            
-            arg_vars = []
-            for arg in node.args:
-                arg_vars.append(self.generate_expr(arg))
-            
-            selector = node.selector.replace(':', '-')
-            args_str = ' '.join(self.var_ref(v) for v in arg_vars)
-            recv_ref = self.var_ref(recv_var)
-            
-            if args_str:
-                self.lines.append(f"{target_var}=$(./send {recv_ref} {selector} {args_str})")
-            else:
-                self.lines.append(f"{target_var}=$(./send {recv_ref} {selector})")
-        
-        elif isinstance(node, CascadeNode):
-            # For cascade, generate all messages, last one goes into target
-            recv_var = self.generate_expr(node.receiver)
-            
-            for i, (selector, args) in enumerate(node.messages):
-                is_last_msg = (i == len(node.messages) - 1)
-                
-                arg_vars = []
-                for arg in args:
-                    arg_vars.append(self.generate_expr(arg))
-                
-                selector = selector.replace(':', '-')
-                recv_ref = self.var_ref(recv_var)
-                args_str = ' '.join(self.var_ref(v) for v in arg_vars)
-                
-                if is_last_msg:
-                    if args_str:
-                        self.lines.append(f"{target_var}=$(./send {recv_ref} {selector} {args_str})")
-                    else:
-                        self.lines.append(f"{target_var}=$(./send {recv_ref} {selector})")
-                else:
-                    tmp = self.new_tmp()
-                    if args_str:
-                        self.lines.append(f"{tmp}=$(./send {recv_ref} {selector} {args_str})")
-                    else:
-                        self.lines.append(f"{tmp}=$(./send {recv_ref} {selector})")
-        
-        elif isinstance(node, AssignNode):
-            # Nested assignment - do inner assignment, then copy to target
-            result = self.generate_expr(node)
-            self.lines.append(f"{target_var}=${result}")
-        
-        elif isinstance(node, BlockNode):
-            # Block - generate it and assign to target
-            result = self.generate_block(node)
-            self.lines.append(f"{target_var}=${result}")
-        
+            if sink == SINK_DISCARD:
+                return None
+            if sink == SINK_FINAL:
+                self.lines.append(TMPL_IVAR_CAT % name)
+                return None
+            if sink == SINK_TMP:
+                target = self.new_tmp()
+            self.lines.append(TMPL_IVAR_READ % (target, name))
+            return f"${target}"
+        return self._deliver(value, sink, target)
+    
+    def _generate_assign(self, node: AssignNode, sink: int, target: Optional[str]) -> Optional[str]:
+        name = node.name
+        if name in self.temps or name in self.params:
+            # Local variable assignment - generate directly into this name
+            value_ref = self.generate(node.value, SINK_INTO, name)
         else:
-            raise NotImplementedError(f"Unknown node type: {type(node)}")
+            # Instance variable assignment
+            value_ref = self.generate(node.value, SINK_TMP)
+            self.lines.append(TMPL_IVAR_WRITE % (value_ref, name))
+        return self._deliver(value_ref, sink, target)
     
-    def generate_send(self, node: SendNode) -> str:
-        """Generate a message send"""
-        recv_var = self.generate_expr(node.receiver)
-        
-        # Generate arguments
-        arg_vars = []
-        for arg in node.args:
-            arg_vars.append(self.generate_expr(arg))
-        
-        # Build selector (replace : with -)
-        selector = node.selector.replace(':', '-')
-        
-        # Build send command
-        tmp = self.new_tmp()
-        args_str = ' '.join(self.var_ref(v) for v in arg_vars)
-        recv_ref = self.var_ref(recv_var)
-        
+    def _generate_send(self, node: SendNode, sink: int, target: Optional[str]) -> Optional[str]:
+        recv_ref = self.generate(node.receiver, SINK_TMP)
+        return self._send(recv_ref, self._message(node.selector, node.args), sink, target)
+    
+    def _generate_cascade(self, node: CascadeNode, sink: int, target: Optional[str]) -> Optional[str]:
+        recv_ref = self.generate(node.receiver, SINK_TMP)
+        
+        # Consecutive messages share one ./send --cascade process, unless a
+        # message's arguments need code of their own: that code must run
+        # after the earlier messages are sent, so it starts a new group.
+        # Only the last group's result is the cascade's value
+        group = []
+        for selector, args in zip(node.selectors, node.arg_lists):
+            if group and not all(self._needs_no_code(arg) for arg in args):
+                self._send_group(recv_ref, group, SINK_DISCARD, None)
+                group = []
+            group.append(self._message(selector, args))
+        return self._send_group(recv_ref, group, sink, target)
+    
+    def _send_group(self, recv_ref: str, group: List[str], sink: int, target: Optional[str]) -> Optional[str]:
+        """Emit one process sending each message in group to the receiver"""
+        if len(group) == 1:
+            return self._send(recv_ref, group[0], sink, target)
+        return self._send(f"--cascade {recv_ref}", ' \\; '.join(group), sink, target)
+    
+    def _message(self, selector: str, args: Sequence[ASTNode]) -> str:
+        """Generate a send's arguments, return the mangled selector followed by their references"""
+        args_str = self.generate_args(args)
         if args_str:
-            self.lines.append(f"{tmp}=$(./send {recv_ref} {selector} {args_str})")
-        else:
-            self.lines.append(f"{tmp}=$(./send {recv_ref} {selector})")
-        
-        return tmp
+            return f"{mangle_selector(selector)} {args_str}"
+        return mangle_selector(selector)
     
-    def generate_cascade(self, node: CascadeNode) -> str:
-        """Generate cascaded messages"""
-        recv_var = self.generate_expr(node.receiver)
-        
-        last_result = None
-        for selector, args in node.messages:
-            arg_vars = []
-            for arg in args:
-                arg_vars.append(self.generate_expr(arg))
-            
-            selector = selector.replace(':', '-')
-            tmp = self.new_tmp()
-            args_str = ' '.join(self.var_ref(v) for v in arg_vars)
-            recv_ref = self.var_ref(recv_var)
-            
-            if args_str:
-                self.lines.append(f"{tmp}=$(./send {recv_ref} {selector} {args_str})")
-            else:
-                self.lines.append(f"{tmp}=$(./send {recv_ref} {selector})")
-            
-            last_result = tmp
-        
-        return last_result
+    def _needs_no_code(self, node: ASTNode) -> bool:
+        """True if generating node emits no lines, only a reference"""
+        if isinstance(node, LiteralNode):
+            return True
+        if isinstance(node, VariableNode):
+            # Everything but an instance variable (which is read from its file)
+            return self.var_ref(node.name) is not None
+        return False
+    
+    def _generate_block_value(self, node: BlockNode, sink: int, target: Optional[str]) -> Optional[str]:
+        return self._deliver(self.generate_block(node), sink, target)
     
     def _collect_referenced_names(self, nodes: List[ASTNode]) -> Set[str]:
         """Collect all variable names referenced in a list of AST nodes, including nested blocks."""
@@ -1102,7 +988,7 @@ class CodeGenerator:
                 self._collect_names_from_node(arg, names)
         elif isinstance(node, CascadeNode):
             self._collect_names_from_node(node.receiver, names)
-            for _, args in node.messages:
+            for args in node.arg_lists:
                 for arg in args:
                     self._collect_names_from_node(arg, names)
         elif isinstance(node, ReturnNode):
@@ -1130,13 +1016,8 @@ class CodeGenerator:
         # Determine captured variables: only include names that are actually used
         # and are from outer scope (temps or params), not the block's own params/temps
         block_own_names = set(node.params) | set(node.temps)
-        potential_captures = ['self']
-        for t in self.temps:
-            if t != 'self' and t not in potential_captures:
-                potential_captures.append(t)
-        for p in self.params:
-            if p != 'self' and p not in potential_captures:
-                potential_captures.append(p)
+        # (dict.fromkeys drops duplicates in one pass, keeping first-seen order)
+        potential_captures = dict.fromkeys(['self', *self.temps, *self.params])
         
         # Filter to only actually referenced names (that aren't block's own params/temps)
         captured = [name for name in potential_captures 
@@ -1144,7 +1025,6 @@ class CodeGenerator:
         
         # Build the block method source comment
         # _method: captured1 and: captured2 ... and: blockParam1 ...
-        block_source_lines = []
         sig_parts = []
         all_block_params = captured + node.params
         for i, name in enumerate(all_block_params):
@@ -1153,26 +1033,20 @@ class CodeGenerator:
             else:
                 sig_parts.append(f"and: {name}")
         sig_line = ' '.join(sig_parts) if sig_parts else "_method"
-        block_source_lines.append(sig_line)
         
         # Extract verbatim block body source from original
         block_body_source = self.source[node.body_start:node.body_end].strip()
-        for line in block_body_source.split('\n'):
-            block_source_lines.append(line)
         
         # Generate the block method's bash code
-        block_lines = []
-        for line in block_source_lines:
-            block_lines.append(f"# {line}")
-        block_lines.append("#")
+        block_lines = [TMPL_COMMENT % sig_line, comment_out(block_body_source), "#"]
         
         # Parameters: captured vars then block params
         param_index = 1
         for name in captured:
-            block_lines.append(f"{name}=${param_index}")
+            block_lines.append(TMPL_PARAM % (name, param_index))
             param_index += 1
         for name in node.params:
-            block_lines.append(f"{name}=${param_index}")
+            block_lines.append(TMPL_PARAM % (name, param_index))
             param_index += 1
         
         # Generate block body with a new generator context
@@ -1180,13 +1054,15 @@ class CodeGenerator:
         old_lines = self.lines
         old_temps = self.temps
         old_params = self.params
+        old_var_refs = self.var_refs
         old_tmp_counter = self.tmp_counter
         old_in_block = self.in_block
         
-        # Set up for block body generation
-        self.lines = []
+        # Set up for block body generation, emitting after the header
+        self.lines = block_lines
         self.temps = set(node.temps)
         self.params = set(captured) | set(node.params)
+        self.var_refs = {}
         self.tmp_counter = 0
         self.in_block = True  # We're now generating code inside a block
         
@@ -1201,18 +1077,17 @@ class CodeGenerator:
         # Pop block path stack
         self.block_path_stack.pop()
         
-        # Collect generated body lines
-        body_lines = self.lines
-        
         # Restore state
         self.lines = old_lines
+        emit = self.lines.append
         self.temps = old_temps
         self.params = old_params
+        self.var_refs = old_var_refs
         self.tmp_counter = old_tmp_counter
         self.in_block = old_in_block
         
-        # Combine block method
-        block_script = '\n'.join(block_lines + body_lines)
+        # Join the block method once, header and body together
+        block_script = '\n'.join(block_lines)
         
         # Store extracted block
         self.extracted_blocks.append((block_method_name, block_script))
@@ -1221,53 +1096,167 @@ class CodeGenerator:
         # 1. Create bindings array with captured values
         num_captured = len(captured)
         bindings_var = self.new_tmp()
-        if 1 <= num_captured <= 4:
-            cap_refs = ' '.join(f"${name}" for name in captured)
         if num_captured == 0:
-            self.lines.append(f"{bindings_var}=$(./send Array new)")
-        elif num_captured == 1:
-            self.lines.append(f"{bindings_var}=$(./send Array with- {cap_refs})")
-        elif num_captured == 2:
-            self.lines.append(f"{bindings_var}=$(./send Array with-with- {cap_refs})")
-        elif num_captured == 3:
-            self.lines.append(f"{bindings_var}=$(./send Array with-with-with- {cap_refs})")
-        elif num_captured == 4:
-            self.lines.append(f"{bindings_var}=$(./send Array with-with-with-with- {cap_refs})")
+            emit(TMPL_SEND_CAPTURE % (bindings_var, 'Array', 'new'))
+        elif num_captured < len(ARRAY_WITH_SELECTORS):
+            cap_refs = ' '.join([f"${name}" for name in captured])
+            emit(TMPL_SEND_CAPTURE % (bindings_var, 'Array', f"{ARRAY_WITH_SELECTORS[num_captured]} {cap_refs}"))
         else:
             # For more captures, build incrementally
-            self.lines.append(f"{bindings_var}=$(./send Array new- int/{num_captured})")
+            emit(TMPL_SEND_CAPTURE % (bindings_var, 'Array', f"new- int/{num_captured}"))
             for i, name in enumerate(captured, start=1):
-                self.lines.append(f"_=$(./send ${bindings_var} at-put- int/{i} ${name})")
+                emit(TMPL_SEND_CAPTURE % ('_', '$' + bindings_var, f"at-put- int/{i} ${name}"))
         
         # 2. Create BlockClosure
         # Use directory of current script (blocks are sibling files)
-        self.lines.append("blockDir=${0%/*}")
+        emit("blockDir=${0%/*}")
         block_var = self.new_tmp()
-        self.lines.append(f"{block_var}=$(./send BlockClosure fromCode-with- $blockDir/{block_method_name} ${bindings_var})")
+        emit(TMPL_SEND_CAPTURE % (block_var, 'BlockClosure',
+                                   f"fromCode-with- $blockDir/{block_method_name} ${bindings_var}"))
         
-        return block_var
+        return f"${block_var}"
 
 # ----------------------------------------------------------------------
 # Main
 # ----------------------------------------------------------------------
 
+# Transpiled methods are cached on disk, since a method's output depends only
+# on its source and on this transpiler
+CACHE_DIR = os.path.expanduser(os.environ.get('SMALLTIX_CACHE', '~/.cache/smalltix'))
+
+@functools.lru_cache(maxsize=None)
+def transpiler_digest() -> bytes:
+    """Hash of this file, so that changing the transpiler invalidates the cache"""
+    with open(__file__, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).digest()
+
+def cache_path(source: str) -> str:
+    """Cache entry for source: CACHE_DIR/<transpiler digest>/<source digest>
+    
+    Each version of the transpiler gets its own subdirectory, since editing
+    this file orphans every entry written before; the stale generations can
+    then be removed wholesale.
+    """
+    key = hashlib.blake2b(source.encode('utf-8', 'surrogatepass'), digest_size=16)
+    return os.path.join(CACHE_DIR, transpiler_digest().hex(), key.hexdigest())
+
 def transpile(source: str) -> Tuple[str, List[Tuple[str, str]]]:
     """Transpile Smalltalk method source to Bash script.
     
+    Results are cached under SMALLTIX_CACHE (default ~/.cache/smalltix), in
+    a subdirectory per version of this file; set SMALLTIX_NOCACHE to bypass
+    the cache. Nothing prunes it.
+    
     Returns: (main_script, [(block_name, block_script), ...])
     """
+    if os.environ.get('SMALLTIX_NOCACHE'):
+        return transpile_uncached(source)
+    
+    path = cache_path(source)
+    try:
+        with open(path, encoding='utf-8') as f:
+            main_script, blocks = json.load(f)
+        return (main_script, [tuple(block) for block in blocks])
+    except (OSError, ValueError):
+        pass
+    
+    result = transpile_uncached(source)
+    # Write then rename, so a concurrent reader never sees half an entry
+    tmp_path = f"{path}.{os.getpid()}"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # An unwritable cache only costs speed, but don't leave a partial
+        # entry behind: nothing else would ever clean it up
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+    return result
+
+def transpile_uncached(source: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """Transpile without consulting the cache"""
     tokens = tokenize(source)
     parser = Parser(tokens, source)
     ast = parser.parse_method()
     gen = CodeGenerator(source)
     return gen.generate_method(ast, source)
 
-def main():
+def write_script(path: str, script: str) -> None:
+    """Write a generated script as UTF-8 with Unix line endings, in one write"""
+    with open(path, 'wb') as f:
+        f.write(script.encode('utf-8') + b'\n')
+
+def write_method(source: str, main_script: str, blocks: List[Tuple[str, str]], output_dir: str) -> List[str]:
+    """Write a transpiled method and its blocks into output_dir, return the paths written"""
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Extract method name from source (first line)
+    first_line = source.strip().split('\n')[0]
+    method_name = first_line.split()[0] if first_line else 'method'
+    method_name = mangle_selector(method_name)
+    
+    # Write main method
+    main_path = os.path.join(output_dir, method_name)
+    write_script(main_path, main_script)
+    written = [main_path]
+    
+    # Write block methods
+    for block_name, block_script in blocks:
+        block_path = os.path.join(output_dir, block_name)
+        write_script(block_path, block_script)
+        written.append(block_path)
+    return written
+
+def transpile_file(path: str, output_dir: str) -> Tuple[List[str], Optional[str]]:
+    """Transpile one source file into output_dir (a --batch worker)
+    
+    Returns: (paths written, error message or None)
+    """
+    try:
+        with open(path, 'rb') as f:
+            source = f.read().decode('utf-8')
+        main_script, blocks = transpile(source)
+        return (write_method(source, main_script, blocks, output_dir), None)
+    except (OSError, UnicodeDecodeError, SyntaxError, NotImplementedError, RecursionError) as e:
+        # Reported per file, so one bad file doesn't lose the rest of the batch
+        # (RecursionError: the parser recurses once per nesting level)
+        return ([], f"{path}: {e}")
+
+def main_batch(output_dir: str, paths: List[str]) -> None:
+    """Transpile many files into output_dir, spread over all cores"""
+    if len(paths) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor() as pool:
+            results = list(pool.map(transpile_file, paths, [output_dir] * len(paths)))
+    else:
+        results = [transpile_file(path, output_dir) for path in paths]
+    
+    # Report in one write per stream rather than a print per file
+    report = [f"Written: {path}" for written, _ in results for path in written]
+    errors = [f"Error: {error}" for _, error in results if error]
+    if report:
+        sys.stdout.write('\n'.join(report) + '\n')
+    if errors:
+        sys.stdout.flush()
+        sys.stderr.write('\n'.join(errors) + '\n')
+        sys.exit(1)
+
+def main() -> None:
     if len(sys.argv) < 2:
         print("Usage: smalltix_transpiler.py <source_file> [output_dir]", file=sys.stderr)
         print("       smalltix_transpiler.py -e '<smalltalk source>'", file=sys.stderr)
+        print("       smalltix_transpiler.py --batch <output_dir> <source_file>...", file=sys.stderr)
         sys.exit(1)
     
+    if sys.argv[1] == '--batch':
+        if len(sys.argv) < 4:
+            print("Error: --batch requires an output directory and source files", file=sys.stderr)
+            sys.exit(1)
+        main_batch(sys.argv[2], sys.argv[3:])
+        return
+    
     if sys.argv[1] == '-e':
         if len(sys.argv) < 3:
             print("Error: -e requires source argument", file=sys.stderr)
@@ -1275,45 +1264,27 @@ def main():
         source = sys.argv[2]
         output_dir = sys.argv[3] if len(sys.argv) > 3 else None
     else:
-        with open(sys.argv[1], 'r') as f:
-            source = f.read()
+        source = None
         output_dir = sys.argv[2] if len(sys.argv) > 2 else None
     
     try:
+        if source is None:
+            with open(sys.argv[1], 'rb') as f:
+                source = f.read().decode('utf-8')
         main_script, blocks = transpile(source)
         
         if output_dir:
-            import os
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Extract method name from source (first line)
-            first_line = source.strip().split('\n')[0]
-            method_name = first_line.split()[0] if first_line else 'method'
-            method_name = method_name.replace(':', '-')
-            
-            # Write main method
-            main_path = os.path.join(output_dir, method_name)
-            with open(main_path, 'w') as f:
-                f.write(main_script)
-                f.write('\n')
-            print(f"Written: {main_path}")
-            
-            # Write block methods
-            for block_name, block_script in blocks:
-                block_path = os.path.join(output_dir, block_name)
-                with open(block_path, 'w') as f:
-                    f.write(block_script)
-                    f.write('\n')
-                print(f"Written: {block_path}")
+            out = [f"Written: {path}" for path in write_method(source, main_script, blocks, output_dir)]
         else:
             # Print to stdout
-            print("=== Main Method ===")
-            print(main_script)
+            out = ["=== Main Method ===", main_script]
             for block_name, block_script in blocks:
-                print(f"\n=== Block: {block_name} ===")
-                print(block_script)
+                out.append(f"\n=== Block: {block_name} ===")
+                out.append(block_script)
+        # One write for the whole report rather than a print per piece
+        sys.stdout.write('\n'.join(out) + '\n')
     
-    except (SyntaxError, NotImplementedError) as e:
+    except (OSError, UnicodeDecodeError, SyntaxError, NotImplementedError, RecursionError) as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
@@ -9,9 +9,9 @@ async def handler(websocket):
     print('Client connected')
     try:
         async for message in websocket:
-            for client in clients:
-                if client != websocket:
-                    await client.send(message)
+            # Queue the message on every other client without waiting on
+            # any of them, so one slow peer can't hold up the rest
+            websockets.broadcast([client for client in clients if client != websocket], message)
     except websockets.exceptions.ConnectionClosed:
         pass  # Client disconnected abruptly, that's fine
     finally: